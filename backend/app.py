@@ -3,17 +3,26 @@ FastAPI backend for RAG chatbot UI
 """
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
 import sqlite3
+import threading
 import pickle
 import numpy as np
 import faiss
 from sentence_transformers import SentenceTransformer
-from rank_bm25 import BM25Okapi
-import subprocess
-import datetime
+from scipy.sparse import csc_matrix, load_npz, save_npz
+from collections import Counter, OrderedDict
+import hashlib
+from ollama import AsyncClient
+try:
+    from pybloom_live import ScalableBloomFilter
+except ImportError:
+    ScalableBloomFilter = None
+import asyncio
+import json
+import re
 import textwrap
 import os
 
@@ -21,6 +30,8 @@ import os
 # Configuration
 # -----------------------
 DB_FILE = "chunks.db"
+EMBEDDINGS_BIN = "embeddings.bin"
+EMB_DIM = 384
 EMBEDDING_MODEL = "all-MiniLM-L6-v2"
 TOP_K_FAISS = 100
 TOP_K_BM25 = 100
@@ -28,6 +39,72 @@ FINAL_TOP_K = 8
 DEFAULT_ALPHA = 0.6
 MIN_COMBINED_SCORE_TO_ANSWER = 0.12
 OLLAMA_MODEL = "gpt-oss:20b-cloud"
+OLLAMA_TIMEOUT = 300
+INDEX_CACHE_DIR = "cache"
+
+# sqlite tables that never hold document chunks.
+MANAGEMENT_TABLES = {"sqlite_sequence", "chat_sessions", "chat_messages",
+                     "question_cache", "embedding_offsets"}
+ONNX_MODEL_DIR = "minilm-onnx"
+BM25_K1 = 1.5
+BM25_B = 0.75
+QEMB_CACHE_SIZE = 1024
+ANSWER_CACHE_SIZE = 1024
+QTOK_CACHE_SIZE = 1024
+NEGATIVE_BLOOM_CAPACITY = 100000
+NEGATIVE_BLOOM_ERROR_RATE = 0.001
+
+_TOKEN_RE = re.compile(r"\w+")
+
+# Static instructions for the chat endpoint. Kept byte-identical across
+# requests so Ollama/llama.cpp can reuse the KV cache for the prefix.
+SYSTEM_PROMPT = """# DOCUMENT-BASED QUESTION ANSWERING TASK
+
+You answer questions using ONLY the context provided in the user message.
+
+## INSTRUCTIONS:
+1. **USE ONLY THE PROVIDED CONTEXT** - Do not use any external knowledge
+2. **SYNTHESIZE INFORMATION** - Combine relevant information from multiple sources if applicable
+3. **BE DETAILED AND WELL-STRUCTURED** - Provide comprehensive answer with clear organization
+4. **USE MARKDOWN FORMATTING**:
+   - Use **bold** for emphasis and important terms
+   - Use bullet points for lists
+   - Use tables for comparisons, data presentation, or structured information
+   - Use headers (##, ###) for section organization
+5. **TABLE CREATION GUIDELINES**:
+   - Create tables when comparing multiple items, showing features, or presenting structured data
+   - Use proper markdown table syntax with headers and alignment
+   - Example table format:
+     | Feature | Item A | Item B | Item C |
+     |---------|--------|--------|--------|
+     | Price   | $100   | $150   | $200   |
+     | Rating  | 4.5    | 4.2    | 4.8    |
+6. **CITE YOUR SOURCES** - For each key point, include citation like [Source X]
+7. **IF INFORMATION IS INSUFFICIENT** - If the context does not contain enough information to answer the question properly, respond with exactly: "Data not found"
+8. **DO NOT INVENT INFORMATION** - Only use what's explicitly stated in the context
+9. **DO NOT INCLUDE THINKING OR ANALYSIS** - Provide only the final answer
+
+## ANSWER STRUCTURE:
+1. Start with a direct, concise answer to the question
+2. Provide detailed explanations with supporting evidence from sources
+3. Use tables when presenting comparisons, features, or structured data
+4. Include specific examples from the context with proper citations
+5. End with a brief summary or conclusion
+6. Format using markdown for better readability"""
+
+# FAISS intra-op threads; leave headroom for the other worker processes.
+faiss.omp_set_num_threads(max(1, os.cpu_count() // 2))
+
+# Lines of model "thinking"/analysis to strip from answers, matched in one
+# multiline pass instead of a Python loop over every line.
+_DROP_LINE_RE = re.compile(
+    r"^\s*(?:thinking:|analysis:|##\s*analysis|first,|let me|i need to"
+    r"|.{0,20}based on the context).*$\n?",
+    re.IGNORECASE | re.MULTILINE
+)
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 128
 
 # -----------------------
 # Models
@@ -56,6 +133,39 @@ class ChatResponse(BaseModel):
     session_id: int
     sources: List[Dict[str, Any]]
 
+# -----------------------
+# ONNX encoder
+# -----------------------
+class ONNXEncoder:
+    """SentenceTransformer-compatible encode() backed by ONNX Runtime.
+
+    One-time export:
+        optimum-cli export onnx --model sentence-transformers/all-MiniLM-L6-v2 \\
+            --task feature-extraction ./minilm-onnx
+    optionally int8-quantized with optimum.onnxruntime.ORTQuantizer
+    (AutoQuantizationConfig.avx512_vnni(is_static=False)).
+    """
+    def __init__(self, model_dir):
+        import onnxruntime
+        from transformers import AutoTokenizer
+        from optimum.onnxruntime import ORTModelForFeatureExtraction
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = os.cpu_count()
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.model = ORTModelForFeatureExtraction.from_pretrained(
+            model_dir, session_options=options
+        )
+
+    def encode(self, texts, convert_to_numpy=True, normalize_embeddings=False):
+        enc = self.tokenizer(texts, padding=True, truncation=True, return_tensors="np")
+        hidden = np.asarray(self.model(**enc).last_hidden_state)
+        mask = enc["attention_mask"][..., None].astype(np.float32)
+        emb = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+        emb = emb.astype(np.float32, copy=False)
+        if normalize_embeddings:
+            emb /= np.maximum(np.linalg.norm(emb, axis=1, keepdims=True), 1e-12)
+        return emb
+
 # -----------------------
 # RAG System Class
 # -----------------------
@@ -64,19 +174,48 @@ class RAGSystemAPI:
         if not os.path.exists(db_path):
             raise FileNotFoundError(f"DB file '{db_path}' not found.")
         
-        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.db_path = db_path
+        self._local = threading.local()
         self.init_management_tables()
         
-        print("Loading chunks and building indices...")
-        self.chunks = self.load_chunks()
-        print(f"Loaded {len(self.chunks)} chunks.")
-        
-        self.faiss_index, self.emb_matrix = self.build_faiss_from_chunks(self.chunks)
-        self.bm25, self.bm25_tokenized = self.build_bm25_from_chunks(self.chunks)
+        self._load_or_build(embedding_model)
         
-        self.embed_model = SentenceTransformer(embedding_model)
+        self.embed_model = self.build_encoder(embedding_model)
+        self.ollama_client = AsyncClient()
         self.alpha = DEFAULT_ALPHA
+        self._qemb_cache = OrderedDict()
+        self._answer_cache = OrderedDict()
+        self._qtok_cache = OrderedDict()
+        self._load_negative_cache()
     
+    def build_encoder(self, embedding_model):
+        # Prefer the exported ONNX graph (3-5x faster on CPU); fall back
+        # to the PyTorch SentenceTransformer when no export is present.
+        if os.path.isdir(ONNX_MODEL_DIR):
+            try:
+                encoder = ONNXEncoder(ONNX_MODEL_DIR)
+                print("Using ONNX Runtime encoder.")
+                return encoder
+            except Exception as e:
+                print(f"ONNX encoder unavailable ({e}); falling back to SentenceTransformer.")
+        return SentenceTransformer(embedding_model)
+
+    @property
+    def conn(self):
+        # sqlite connections must not be shared across processes or
+        # threads; open one lazily per thread and re-open after a pid
+        # change so the instance stays usable under any supervisor,
+        # including preload/fork setups like gunicorn --preload.
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA temp_store=MEMORY")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
     def init_management_tables(self):
         cur = self.conn.cursor()
         cur.execute("""
@@ -105,14 +244,87 @@ class RAGSystemAPI:
         """)
         self.conn.commit()
     
+    def _index_signature(self, embedding_model):
+        # The same sqlite file receives chat/cache writes on every question,
+        # so its mtime says nothing about the corpus. Fingerprint what the
+        # indices are actually built from: the chunk tables and row counts.
+        cur = self.conn.cursor()
+        cur.execute("SELECT name FROM sqlite_master WHERE type='table' ORDER BY name")
+        parts = [embedding_model]
+        for (t,) in cur.fetchall():
+            if t in MANAGEMENT_TABLES:
+                continue
+            try:
+                cur.execute(f'SELECT COUNT(*) FROM "{t}"')
+                parts.append(f"{t}:{cur.fetchone()[0]}")
+            except sqlite3.OperationalError:
+                continue
+        return hashlib.sha1("|".join(parts).encode()).hexdigest()[:16]
+
+    def _load_or_build(self, embedding_model):
+        # Rebuilding FAISS + BM25 from sqlite on every process start costs
+        # tens of seconds for large corpora, and every uvicorn worker pays
+        # it. Serialize the built artifacts keyed on the corpus signature so
+        # warm starts just load them; new uploads or a new model invalidate
+        # the key.
+        key = self._index_signature(embedding_model)
+        base = os.path.join(INDEX_CACHE_DIR, key)
+        faiss_path = base + ".faiss"
+        bm25_path = base + ".bm25.npz"
+        meta_path = base + ".meta.pkl"
+
+        if all(os.path.exists(p) for p in (faiss_path, bm25_path, meta_path)):
+            print("Loading prebuilt indices from cache...")
+            self.faiss_index = faiss.read_index(faiss_path)
+            self.bm25_matrix = load_npz(bm25_path).tocsr()
+            with open(meta_path, "rb") as f:
+                meta = pickle.load(f)
+            self.tables = meta["tables"]
+            self.chunk_ids = meta["chunk_ids"]
+            self.pages = meta["pages"]
+            self.texts = meta["texts"]
+            self.vocab = meta["vocab"]
+            self.emb_matrix = None
+            print(f"Loaded {len(self.texts)} chunks from cache.")
+            return
+
+        print("Loading chunks and building indices...")
+        self.load_chunks()
+        print(f"Loaded {len(self.texts)} chunks.")
+        self.faiss_index = self.build_faiss_from_chunks(self.emb_matrix)
+        self.bm25_matrix, self.vocab = self.build_bm25_from_chunks(self.texts)
+
+        os.makedirs(INDEX_CACHE_DIR, exist_ok=True)
+        # Write each artifact to a temp file and rename it into place:
+        # on a cold cache several uvicorn workers build concurrently, and
+        # a reader must never see a half-written file.
+        tmp_suffix = f".tmp{os.getpid()}"
+        faiss.write_index(self.faiss_index, faiss_path + tmp_suffix)
+        os.replace(faiss_path + tmp_suffix, faiss_path)
+        save_npz(bm25_path + tmp_suffix + ".npz", self.bm25_matrix)
+        os.replace(bm25_path + tmp_suffix + ".npz", bm25_path)
+        with open(meta_path + tmp_suffix, "wb") as f:
+            pickle.dump({
+                "tables": self.tables,
+                "chunk_ids": self.chunk_ids,
+                "pages": self.pages,
+                "texts": self.texts,
+                "vocab": self.vocab,
+            }, f)
+        os.replace(meta_path + tmp_suffix, meta_path)
+
     def load_chunks(self):
-        chunks = []
+        if self.load_chunks_memmap():
+            return
+        # Metadata is kept in parallel arrays (struct-of-arrays) and all
+        # embeddings land in one contiguous float32 matrix instead of a
+        # list of per-chunk dicts each holding its own little ndarray.
+        tables_col, ids_col, pages_col, texts_col, emb_views = [], [], [], [], []
         cur = self.conn.cursor()
         cur.execute("SELECT name FROM sqlite_master WHERE type='table';")
         tables = [r[0] for r in cur.fetchall()]
-        skip = {"sqlite_sequence", "chat_sessions", "chat_messages", "question_cache"}
-        tables = [t for t in tables if t not in skip]
-        
+        tables = [t for t in tables if t not in MANAGEMENT_TABLES]
+
         for t in tables:
             try:
                 cur.execute(f'SELECT chunk_id, page_number, chunk_text, embedding FROM "{t}"')
@@ -121,103 +333,259 @@ class RAGSystemAPI:
                     cid, pnum, ctext, emb_blob = row
                     if emb_blob is None:
                         continue
-                    try:
-                        emb = pickle.loads(emb_blob)
-                    except:
+                    emb = self.decode_embedding(emb_blob)
+                    if emb is None:
                         continue
-                    chunks.append({
-                        "table": t,
-                        "chunk_id": int(cid),
-                        "page_number": int(pnum) if pnum is not None else None,
-                        "text": ctext,
-                        "embedding": np.array(emb, dtype=np.float32)
-                    })
+                    tables_col.append(t)
+                    ids_col.append(int(cid))
+                    pages_col.append(int(pnum) if pnum is not None else -1)
+                    texts_col.append(ctext)
+                    emb_views.append(emb)
             except:
                 continue
-        return chunks
-    
-    def build_faiss_from_chunks(self, chunks):
-        if len(chunks) == 0:
-            d = 384
-            index = faiss.IndexFlatIP(d)
-            return index, np.zeros((0, d), dtype=np.float32)
-        embs = np.vstack([c["embedding"].astype(np.float32) for c in chunks])
-        faiss.normalize_L2(embs)
-        index = faiss.IndexFlatIP(embs.shape[1])
-        index.add(embs)
-        return index, embs
-    
-    def build_bm25_from_chunks(self, chunks):
-        corpus = [c["text"] if c["text"] else "" for c in chunks]
-        tokenized = [doc.split() for doc in corpus]
-        bm25 = BM25Okapi(tokenized)
-        return bm25, tokenized
+
+        self.tables = tables_col
+        self.chunk_ids = np.array(ids_col, dtype=np.int32)
+        self.pages = np.array(pages_col, dtype=np.int32)
+        self.texts = texts_col
+        if emb_views:
+            self.emb_matrix = np.ascontiguousarray(np.stack(emb_views))
+        else:
+            self.emb_matrix = np.zeros((0, EMB_DIM), dtype=np.float32)
+
+    def load_chunks_memmap(self):
+        # After migrate_embeddings.py has run, the embeddings live in one
+        # contiguous pre-normalized float32 file: startup is a single
+        # np.memmap call plus a metadata SELECT, with no per-row
+        # deserialization, and workers share the pages read-only.
+        if not os.path.exists(EMBEDDINGS_BIN):
+            return False
+        cur = self.conn.cursor()
+        cur.execute("""
+            SELECT name FROM sqlite_master
+            WHERE type='table' AND name='embedding_offsets'
+        """)
+        if cur.fetchone() is None:
+            return False
+
+        # Chunks dropped or re-uploaded since the migration leave the bin
+        # file out of step with the db; fall back to the unmigrated path
+        # instead of failing startup.
+        try:
+            emb = np.memmap(EMBEDDINGS_BIN, dtype=np.float32, mode="r")
+            emb = emb.reshape(-1, EMB_DIM)
+            cur.execute("SELECT tbl, chunk_id, row FROM embedding_offsets ORDER BY row")
+            offsets = cur.fetchall()
+            if emb.shape[0] != len(offsets):
+                raise KeyError("row count mismatch")
+
+            meta = {}
+            for t in sorted({o[0] for o in offsets}):
+                cur.execute(f'SELECT chunk_id, page_number, chunk_text FROM "{t}"')
+                meta[t] = {cid: (pnum, ctext) for cid, pnum, ctext in cur.fetchall()}
+
+            tables_col, ids_col, pages_col, texts_col = [], [], [], []
+            for t, cid, _row in offsets:
+                pnum, ctext = meta[t][cid]
+                tables_col.append(t)
+                ids_col.append(int(cid))
+                pages_col.append(int(pnum) if pnum is not None else -1)
+                texts_col.append(ctext)
+        except (KeyError, ValueError, sqlite3.OperationalError) as e:
+            print(f"embeddings.bin is stale ({e}); rebuilding from table rows.")
+            return False
+
+        self.tables = tables_col
+        self.chunk_ids = np.array(ids_col, dtype=np.int32)
+        self.pages = np.array(pages_col, dtype=np.int32)
+        self.texts = texts_col
+        self.emb_matrix = emb
+        return True
+
+    @staticmethod
+    def decode_embedding(emb_blob):
+        # A raw float32 blob is exactly EMB_DIM * 4 bytes, which no pickled
+        # ndarray can be (pickle framing adds overhead), so length settles
+        # the format unambiguously. Raw blobs decode zero-copy; pickled
+        # rows from the old upload pipeline are still accepted.
+        try:
+            if len(emb_blob) == EMB_DIM * 4:
+                return np.frombuffer(emb_blob, dtype=np.float32)
+            return np.asarray(pickle.loads(emb_blob), dtype=np.float32)
+        except:
+            return None
+
+    def build_faiss_from_chunks(self, embs):
+        # HNSW gives O(log N) search vs IndexFlatIP's O(N*d) scan, and
+        # int8 scalar quantization cuts the stored vectors to a quarter
+        # of the RAM and bandwidth with <1% recall loss on SBERT vectors.
+        index = faiss.IndexHNSWSQ(
+            embs.shape[1], faiss.ScalarQuantizer.QT_8bit, HNSW_M,
+            faiss.METRIC_INNER_PRODUCT
+        )
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+        if embs.shape[0] > 0:
+            # The migrated embeddings.bin is already L2-normalized and
+            # mapped read-only; only normalize writable in-RAM matrices.
+            if embs.flags.writeable:
+                faiss.normalize_L2(embs)
+            index.train(embs)
+            index.add(embs)
+        return index
+
+    def build_bm25_from_chunks(self, texts):
+        # Eagerly score every (term, doc) pair at index time so a query is
+        # just a sum of sparse rows instead of a Python loop over all docs.
+        corpus = [t if t else "" for t in texts]
+        tokenized = [_TOKEN_RE.findall(doc.lower()) for doc in corpus]
+        n_docs = len(tokenized)
+        doc_lens = np.array([len(toks) for toks in tokenized], dtype=np.float32)
+        avg_len = float(doc_lens.mean()) if n_docs else 0.0
+
+        vocab = {}
+        df = Counter()
+        doc_tfs = []
+        for toks in tokenized:
+            tf = Counter(toks)
+            doc_tfs.append(tf)
+            for term in tf:
+                if term not in vocab:
+                    vocab[term] = len(vocab)
+                df[term] += 1
+
+        rows, cols, vals = [], [], []
+        for j, tf in enumerate(doc_tfs):
+            if doc_lens[j] == 0:
+                continue
+            denom_len = BM25_K1 * (1.0 - BM25_B + BM25_B * doc_lens[j] / avg_len)
+            for term, freq in tf.items():
+                idf = np.log((n_docs - df[term] + 0.5) / (df[term] + 0.5) + 1.0)
+                rows.append(vocab[term])
+                cols.append(j)
+                vals.append(idf * freq * (BM25_K1 + 1.0) / (freq + denom_len))
+
+        matrix = csc_matrix(
+            (np.array(vals, dtype=np.float32), (rows, cols)),
+            shape=(len(vocab), n_docs)
+        )
+        return matrix.tocsr(), vocab
     
     def normalize_scores(self, arr):
+        # In-place min-max scaling: two reductions and two fused in-place
+        # ops instead of four full passes plus a fresh array.
         if arr.size == 0:
             return arr
-        mn = float(np.min(arr))
-        mx = float(np.max(arr))
-        if abs(mx - mn) < 1e-12:
+        lo = arr.min()
+        rng = arr.max() - lo
+        if rng < 1e-12:
             return np.zeros_like(arr)
-        return (arr - mn) / (mx - mn)
+        arr -= lo
+        arr *= 1.0 / rng
+        return arr
     
-    def hybrid_retrieve(self, query, top_k_faiss=TOP_K_FAISS, top_k_bm25=TOP_K_BM25, final_k=FINAL_TOP_K):
-        q_emb = self.embed_model.encode([query], convert_to_numpy=True).astype(np.float32)
-        faiss.normalize_L2(q_emb)
-        
+    def _encode_query(self, query):
+        # Repeated questions skip the transformer forward entirely.
+        key = query.strip().lower()
+        cached = self._qemb_cache.get(key)
+        if cached is not None:
+            self._qemb_cache.move_to_end(key)
+            return cached
+        # SBERT already returns float32; normalize_embeddings=True saves
+        # the separate astype copy and normalize_L2 pass.
+        q_emb = self.embed_model.encode([query], convert_to_numpy=True, normalize_embeddings=True)
+        self._qemb_cache[key] = q_emb
+        if len(self._qemb_cache) > QEMB_CACHE_SIZE:
+            self._qemb_cache.popitem(last=False)
+        return q_emb
+
+    def _query_term_ids(self, query):
+        # Same normalizer as the corpus (lowercase + \w+), with the vocab
+        # lookup cached so a repeated question costs one dict.get.
+        key = query.lower()
+        cached = self._qtok_cache.get(key)
+        if cached is not None:
+            self._qtok_cache.move_to_end(key)
+            return cached
+        term_ids = [self.vocab[t] for t in _TOKEN_RE.findall(key) if t in self.vocab]
+        self._qtok_cache[key] = term_ids
+        if len(self._qtok_cache) > QTOK_CACHE_SIZE:
+            self._qtok_cache.popitem(last=False)
+        return term_ids
+
+    def _faiss_topk(self, q_emb, top_k_faiss):
         if self.faiss_index.ntotal == 0:
-            faiss_scores = np.zeros(len(self.chunks), dtype=np.float32)
-        else:
-            k = min(top_k_faiss, self.faiss_index.ntotal)
-            scores, ids = self.faiss_index.search(q_emb, k)
-            faiss_scores = np.zeros(len(self.chunks), dtype=np.float32)
-            if ids is not None and scores is not None:
-                ids = ids.flatten()
-                scores = scores.flatten()
-                faiss_scores[ids] = scores
-        
-        tokenized_q = query.split()
-        bm25_scores = np.array(self.bm25.get_scores(tokenized_q), dtype=np.float32)
-        
-        f_norm = self.normalize_scores(faiss_scores)
-        b_norm = self.normalize_scores(bm25_scores)
-        
-        combined = self.alpha * f_norm + (1.0 - self.alpha) * b_norm
-        
-        top_idxs = np.argsort(-combined)[:final_k]
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        k = min(top_k_faiss, self.faiss_index.ntotal)
+        scores, ids = self.faiss_index.search(q_emb, k)
+        faiss_ids = ids[0]
+        faiss_sc = scores[0]
+        valid = faiss_ids >= 0
+        return faiss_ids[valid], faiss_sc[valid]
+
+    def _bm25_topk(self, term_ids, top_k_bm25):
+        if not term_ids:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        bm25_scores = np.asarray(self.bm25_matrix[term_ids].sum(axis=0)).ravel().astype(np.float32)
+        kb = min(top_k_bm25, bm25_scores.size)
+        bm25_ids = np.argpartition(bm25_scores, -kb)[-kb:]
+        return bm25_ids, bm25_scores[bm25_ids]
+
+    async def hybrid_retrieve(self, query, top_k_faiss=TOP_K_FAISS, top_k_bm25=TOP_K_BM25, final_k=FINAL_TOP_K):
+        q_emb = self._encode_query(query)
+        term_ids = self._query_term_ids(query)
+
+        # FAISS search and BM25 scoring are independent; dispatch both to
+        # the executor so the slower of the two bounds the stage, not the sum.
+        loop = asyncio.get_running_loop()
+        (faiss_ids, faiss_sc), (bm25_ids, bm25_sc) = await asyncio.gather(
+            loop.run_in_executor(None, self._faiss_topk, q_emb, top_k_faiss),
+            loop.run_in_executor(None, self._bm25_topk, term_ids, top_k_bm25),
+        )
+
+        # Normalize and combine only over the candidate union, not the
+        # whole corpus: everything outside it scores zero anyway.
+        union_ids = np.union1d(faiss_ids, bm25_ids)
+        if union_ids.size == 0:
+            return []
+        f_u = np.zeros(union_ids.size, dtype=np.float32)
+        b_u = np.zeros(union_ids.size, dtype=np.float32)
+        f_u[np.searchsorted(union_ids, faiss_ids)] = faiss_sc
+        b_u[np.searchsorted(union_ids, bm25_ids)] = bm25_sc
+
+        f_norm = self.normalize_scores(f_u)
+        b_norm = self.normalize_scores(b_u)
+
+        # Combine in place: f_norm is scratch at this point.
+        combined = f_norm
+        combined *= self.alpha
+        combined += (1.0 - self.alpha) * b_norm
+
+        kf = min(final_k, combined.size)
+        top_pos = np.argpartition(-combined, kf - 1)[:kf]
+        top_pos = top_pos[np.argsort(-combined[top_pos])]
         results = []
-        for idx in top_idxs:
-            if combined[idx] <= 0:
+        for pos in top_pos:
+            if combined[pos] <= 0:
                 continue
-            chunk_info = {
-                "table": self.chunks[idx]["table"],
-                "chunk_id": self.chunks[idx]["chunk_id"],
-                "page": self.chunks[idx]["page_number"],
-                "text": self.chunks[idx]["text"][:300] + "...",
-                "score": float(combined[idx]),
-                "faiss_score": float(f_norm[idx]),
-                "bm25_score": float(b_norm[idx])
-            }
-            results.append(chunk_info)
-        
-        return sorted(results, key=lambda x: x["score"], reverse=True)
+            idx = int(union_ids[pos])
+            results.append({
+                "table": self.tables[idx],
+                "chunk_id": int(self.chunk_ids[idx]),
+                "page": int(self.pages[idx]) if self.pages[idx] >= 0 else None,
+                "text": self.texts[idx][:300] + "...",
+                "score": float(combined[pos])
+            })
+
+        return results
     
-    def call_ollama(self, prompt):
+    async def call_ollama(self, messages):
         try:
-            proc = subprocess.run(
-                ["ollama", "run", OLLAMA_MODEL],
-                input=prompt.encode("utf-8"),
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                check=True,
-                timeout=300
+            response = await asyncio.wait_for(
+                self.ollama_client.chat(model=OLLAMA_MODEL, messages=messages, stream=False),
+                timeout=OLLAMA_TIMEOUT
             )
-            out = proc.stdout.decode("utf-8").strip()
-            if not out:
-                err = proc.stderr.decode("utf-8").strip()
-                return err
-            return out
+            return response["message"]["content"].strip()
         except Exception as e:
             raise RuntimeError(f"Ollama call error: {e}")
     
@@ -242,9 +610,9 @@ class RAGSystemAPI:
     def get_session_messages(self, session_id):
         cur = self.conn.cursor()
         cur.execute("""
-            SELECT role, message, timestamp 
-            FROM chat_messages 
-            WHERE session_id = ? 
+            SELECT role, message, strftime('%Y-%m-%dT%H:%M:%fZ', timestamp)
+            FROM chat_messages
+            WHERE session_id = ?
             ORDER BY id ASC
         """, (session_id,))
         return cur.fetchall()
@@ -255,35 +623,88 @@ class RAGSystemAPI:
         cur.execute("DELETE FROM chat_sessions WHERE session_id = ?", (session_id,))
         self.conn.commit()
     
-    def append_message(self, session_id, role, message):
+    @staticmethod
+    def _normalize_question(question):
+        # Shared cache key: trims, lowercases and collapses whitespace so
+        # trivially different phrasings of a question hit the same entry.
+        return re.sub(r"\s+", " ", question.strip().lower())
+
+    def _load_negative_cache(self):
+        # Known-unanswerable questions short-circuit before any retrieval.
+        # A scalable filter grows past its initial capacity instead of
+        # raising once the 100,001st negative question arrives.
+        if ScalableBloomFilter is not None:
+            self._negative_bloom = ScalableBloomFilter(
+                initial_capacity=NEGATIVE_BLOOM_CAPACITY,
+                error_rate=NEGATIVE_BLOOM_ERROR_RATE
+            )
+        else:
+            self._negative_bloom = set()
         cur = self.conn.cursor()
-        cur.execute("""
-            INSERT INTO chat_messages (session_id, role, message) 
-            VALUES (?, ?, ?)
-        """, (session_id, role, message))
-        self.conn.commit()
-    
+        cur.execute("SELECT question FROM question_cache WHERE answer='Data not found'")
+        for (q,) in cur.fetchall():
+            self._negative_bloom.add(self._normalize_question(q))
+
+    def _cache_put(self, question, answer):
+        self._answer_cache[question] = answer
+        self._answer_cache.move_to_end(question)
+        if len(self._answer_cache) > ANSWER_CACHE_SIZE:
+            self._answer_cache.popitem(last=False)
+
     def check_cache(self, question):
+        # In-memory LRU first; sqlite only on a miss.
+        key = self._normalize_question(question)
+        cached = self._answer_cache.get(key)
+        if cached is not None:
+            self._answer_cache.move_to_end(key)
+            return cached
         cur = self.conn.cursor()
-        cur.execute("SELECT answer FROM question_cache WHERE question = ?", (question,))
+        cur.execute("SELECT answer FROM question_cache WHERE question = ?", (key,))
         row = cur.fetchone()
-        return row[0] if row else None
-    
-    def save_cache(self, question, answer):
-        cur = self.conn.cursor()
-        cur.execute("""
-            INSERT OR REPLACE INTO question_cache (question, answer, saved_at) 
-            VALUES (?, ?, ?)
-        """, (question, answer, datetime.datetime.utcnow()))
-        self.conn.commit()
+        if row:
+            self._cache_put(key, row[0])
+            return row[0]
+        return None
+
+    def record_exchange(self, session_id, question, answer, cache=False):
+        # All writes for one Q&A round share a single transaction, so WAL
+        # pays one fsync instead of three. The cache row is keyed on the
+        # normalized question; chat history keeps the original text.
+        key = self._normalize_question(question)
+        with self.conn:
+            self.conn.execute("""
+                INSERT INTO chat_messages (session_id, role, message)
+                VALUES (?, ?, ?)
+            """, (session_id, "user", question))
+            self.conn.execute("""
+                INSERT INTO chat_messages (session_id, role, message)
+                VALUES (?, ?, ?)
+            """, (session_id, "assistant", answer))
+            if cache:
+                self.conn.execute("""
+                    INSERT OR REPLACE INTO question_cache (question, answer)
+                    VALUES (?, ?)
+                """, (key, answer))
+        if cache:
+            self._cache_put(key, answer)
+            if answer == "Data not found":
+                self._negative_bloom.add(key)
     
-    def ask_question(self, session_id, question, use_cache=True):
+    async def ask_question(self, session_id, question, use_cache=True):
         # Check cache
         if use_cache:
+            # Known-unanswerable questions skip retrieval and the LLM.
+            if self._normalize_question(question) in self._negative_bloom:
+                cached = "Data not found"
+                self.record_exchange(session_id, question, cached)
+                return {
+                    "answer": cached,
+                    "sources": [],
+                    "from_cache": True
+                }
             cached = self.check_cache(question)
             if cached:
-                self.append_message(session_id, "user", question)
-                self.append_message(session_id, "assistant", cached)
+                self.record_exchange(session_id, question, cached)
                 return {
                     "answer": cached,
                     "sources": [],
@@ -291,125 +712,111 @@ class RAGSystemAPI:
                 }
         
         # Retrieve relevant chunks
-        retrieved = self.hybrid_retrieve(question)
+        retrieved = await self.hybrid_retrieve(question)
         
         if not retrieved or retrieved[0]["score"] < MIN_COMBINED_SCORE_TO_ANSWER:
             response = "Data not found"
-            self.append_message(session_id, "user", question)
-            self.append_message(session_id, "assistant", response)
-            self.save_cache(question, response)
+            self.record_exchange(session_id, question, response, cache=True)
             return {
                 "answer": response,
                 "sources": [],
                 "from_cache": False
             }
         
-        # Build prompt for detailed synthesis with table support
-        history = self.get_session_messages(session_id)
-        history_text = ""
-        if history:
-            history_text = "Previous conversation (for context only):\n"
-            for role, msg, ts in history[-3:]:
-                history_text += f"{role}: {msg}\n"
-        
+        messages = self.build_messages(question, retrieved)
+
+        try:
+            answer = await self.call_ollama(messages)
+            answer = self.postprocess_answer(answer, retrieved)
+        except Exception as e:
+            answer = f"Error generating answer: {str(e)}"
+
+        # Save to chat history and cache
+        self.record_exchange(session_id, question, answer, cache=True)
+
+        return {
+            "answer": answer,
+            "sources": retrieved[:5],
+            "from_cache": False
+        }
+
+    async def stream_answer(self, session_id, question, use_cache=True):
+        # SSE generator for the streaming endpoint: tokens are yielded as
+        # they arrive and the history/cache writes run once the stream ends.
+        # Payloads are JSON-encoded: raw markdown regularly contains
+        # newlines, which would break SSE event framing.
+        if use_cache:
+            if self._normalize_question(question) in self._negative_bloom:
+                response = "Data not found"
+                self.record_exchange(session_id, question, response)
+                yield "data: " + json.dumps(response) + "\n\n"
+                return
+            cached = self.check_cache(question)
+            if cached:
+                self.record_exchange(session_id, question, cached)
+                yield "data: " + json.dumps(cached) + "\n\n"
+                return
+
+        retrieved = await self.hybrid_retrieve(question)
+
+        if not retrieved or retrieved[0]["score"] < MIN_COMBINED_SCORE_TO_ANSWER:
+            response = "Data not found"
+            self.record_exchange(session_id, question, response, cache=True)
+            yield "data: " + json.dumps(response) + "\n\n"
+            return
+
+        messages = self.build_messages(question, retrieved)
+        parts = []
+        try:
+            stream = await self.ollama_client.chat(
+                model=OLLAMA_MODEL, messages=messages, stream=True
+            )
+            async for part in stream:
+                token = part.get("message", {}).get("content", "")
+                if token:
+                    parts.append(token)
+                    yield "data: " + json.dumps(token) + "\n\n"
+        except Exception as e:
+            yield "data: " + json.dumps(f"Error generating answer: {str(e)}") + "\n\n"
+            return
+
+        answer = self.postprocess_answer("".join(parts), retrieved)
+        self.record_exchange(session_id, question, answer, cache=True)
+
+    def build_messages(self, question, retrieved):
         # Prepare context chunks with clear source information
         chunks_with_sources = []
         for i, r in enumerate(retrieved[:5]):
             source_info = f"[Source {i+1}: {r['table']}, Page {r['page']}]"
             chunk_content = r['text'].replace('\n', ' ').strip()
             chunks_with_sources.append(f"{source_info}: {chunk_content}")
-        
+
         context_text = "\n\n".join(chunks_with_sources)
-        
-        # Enhanced prompt for detailed synthesis with markdown and table support
-        prompt = f"""# DOCUMENT-BASED QUESTION ANSWERING TASK
 
-## CONTEXT FROM DOCUMENTS:
-{context_text}
+        # Static instructions go in the system message so the server-side
+        # KV cache can reuse the byte-identical prefill across requests;
+        # only the context and question vary per request.
+        return [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": f"CONTEXT:\n{context_text}\n\nQUESTION: {question}"},
+        ]
 
-## QUESTION TO ANSWER:
-{question}
+    def postprocess_answer(self, answer, retrieved):
+        # Strip thinking/analysis lines in one regex pass
+        answer = _DROP_LINE_RE.sub('', answer).strip()
 
-## INSTRUCTIONS:
-1. **USE ONLY THE PROVIDED CONTEXT ABOVE** - Do not use any external knowledge
-2. **SYNTHESIZE INFORMATION** - Combine relevant information from multiple sources if applicable
-3. **BE DETAILED AND WELL-STRUCTURED** - Provide comprehensive answer with clear organization
-4. **USE MARKDOWN FORMATTING**:
-   - Use **bold** for emphasis and important terms
-   - Use bullet points for lists
-   - Use tables for comparisons, data presentation, or structured information
-   - Use headers (##, ###) for section organization
-5. **TABLE CREATION GUIDELINES**:
-   - Create tables when comparing multiple items, showing features, or presenting structured data
-   - Use proper markdown table syntax with headers and alignment
-   - Example table format:
-     | Feature | Item A | Item B | Item C |
-     |---------|--------|--------|--------|
-     | Price   | $100   | $150   | $200   |
-     | Rating  | 4.5    | 4.2    | 4.8    |
-6. **CITE YOUR SOURCES** - For each key point, include citation like [Source X]
-7. **IF INFORMATION IS INSUFFICIENT** - If the context does not contain enough information to answer the question properly, respond with exactly: "Data not found"
-8. **DO NOT INVENT INFORMATION** - Only use what's explicitly stated in the context
-9. **DO NOT INCLUDE THINKING OR ANALYSIS** - Provide only the final answer
+        # Ensure citations are present and clean
+        if answer and answer != "Data not found":
+            has_citations = any(f"[Source" in answer for f in ["[Source", "[Table:"])
+            if not has_citations and retrieved:
+                top_source = retrieved[0]
+                answer = f"{answer}\n\n*Based on information from: {top_source['table']}, Page {top_source['page']}*"
 
-## ANSWER STRUCTURE:
-1. Start with a direct, concise answer to the question
-2. Provide detailed explanations with supporting evidence from sources
-3. Use tables when presenting comparisons, features, or structured data
-4. Include specific examples from the context with proper citations
-5. End with a brief summary or conclusion
-6. Format using markdown for better readability
+        # Ensure we don't have empty answers
+        if not answer or answer.isspace():
+            answer = "Data not found"
 
-## SYNTHESIZED ANSWER (with markdown formatting):
-Based ONLY on the provided context, provide a comprehensive answer to the question. Use markdown formatting including tables where appropriate:"""
-        
-        try:
-            answer = self.call_ollama(prompt)
-            
-            # Post-process the answer
-            answer = answer.strip()
-            
-            # Remove any thinking or analysis sections if present
-            lines = answer.split('\n')
-            final_lines = []
-            
-            # Filter out analysis sections and keep only the answer
-            for line in lines:
-                line_lower = line.lower()
-                # Skip lines that are clearly analysis or thinking
-                if line_lower.startswith(('thinking:', 'analysis:', '## analysis', 'first,', 'let me', 'i need to')):
-                    continue
-                if 'based on the context' in line_lower and line_lower.index('based on the context') < 20:
-                    continue
-                final_lines.append(line)
-            
-            answer = '\n'.join(final_lines).strip()
-            
-            # Ensure citations are present and clean
-            if answer and answer != "Data not found":
-                # Check if we have any citations
-                has_citations = any(f"[Source" in answer for f in ["[Source", "[Table:"])
-                if not has_citations and retrieved:
-                    top_source = retrieved[0]
-                    answer = f"{answer}\n\n*Based on information from: {top_source['table']}, Page {top_source['page']}*"
-            
-            # Ensure we don't have empty answers
-            if not answer or answer.isspace():
-                answer = "Data not found"
-                
-        except Exception as e:
-            answer = f"Error generating answer: {str(e)}"
-        
-        # Save to chat history and cache
-        self.append_message(session_id, "user", question)
-        self.append_message(session_id, "assistant", answer)
-        self.save_cache(question, answer)
-        
-        return {
-            "answer": answer,
-            "sources": retrieved[:5],
-            "from_cache": False
-        }
+        return answer
 
 # -----------------------
 # FastAPI App
@@ -425,7 +832,11 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Global RAG instance
+# Global RAG instance. uvicorn's multiprocess supervisor spawns workers
+# that each re-import this module and build their own copy (loading from
+# the index cache when warm); constructing in the startup hook keeps the
+# supervisor parent from also paying that cost for an instance it never
+# serves with.
 rag_system = None
 
 @app.on_event("startup")
@@ -447,7 +858,7 @@ async def root():
 
 @app.get("/api/health")
 async def health_check():
-    return {"status": "healthy", "chunks_loaded": len(rag_system.chunks)}
+    return {"status": "healthy", "chunks_loaded": len(rag_system.texts)}
 
 @app.post("/api/sessions", response_model=Dict[str, Any])
 async def create_session(session: SessionCreate):
@@ -470,18 +881,10 @@ async def get_sessions():
 @app.get("/api/sessions/{session_id}/messages", response_model=List[Message])
 async def get_messages(session_id: int):
     messages = rag_system.get_session_messages(session_id)
-    # Ensure timestamps are properly formatted
-    formatted_messages = []
-    for role, message, timestamp in messages:
-        # Convert timestamp to ISO format if it's not already
-        if timestamp and not isinstance(timestamp, str):
-            timestamp = str(timestamp)
-        formatted_messages.append({
-            "role": role,
-            "message": message,
-            "timestamp": timestamp or datetime.datetime.utcnow().isoformat()
-        })
-    return formatted_messages
+    return [
+        {"role": role, "message": message, "timestamp": timestamp}
+        for role, message, timestamp in messages
+    ]
 
 @app.delete("/api/sessions/{session_id}")
 async def delete_session(session_id: int):
@@ -493,7 +896,7 @@ async def ask_question(request: QuestionRequest):
     if not request.session_id:
         request.session_id = rag_system.create_session("Auto-created session")
     
-    result = rag_system.ask_question(
+    result = await rag_system.ask_question(
         request.session_id,
         request.question,
         request.use_cache
@@ -505,6 +908,20 @@ async def ask_question(request: QuestionRequest):
         sources=result["sources"]
     )
 
+@app.post("/api/ask/stream")
+async def ask_question_stream(request: QuestionRequest):
+    if not request.session_id:
+        request.session_id = rag_system.create_session("Auto-created session")
+
+    return StreamingResponse(
+        rag_system.stream_answer(
+            request.session_id,
+            request.question,
+            request.use_cache
+        ),
+        media_type="text/event-stream"
+    )
+
 @app.put("/api/alpha/{alpha_value}")
 async def set_alpha(alpha_value: float):
     if 0.0 <= alpha_value <= 1.0:
@@ -515,11 +932,12 @@ async def set_alpha(alpha_value: float):
 @app.get("/api/stats")
 async def get_stats():
     return {
-        "total_chunks": len(rag_system.chunks),
+        "total_chunks": len(rag_system.texts),
         "alpha": rag_system.alpha,
-        "tables": len(set(c["table"] for c in rag_system.chunks))
+        "tables": len(set(rag_system.tables))
     }
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    # Each worker holds its own model + indices; size the count to RAM.
+    uvicorn.run("app:app", host="0.0.0.0", port=8000, workers=max(1, os.cpu_count() // 2))
\ No newline at end of file
@@ -0,0 +1,87 @@
+"""
+One-off migration: move per-row embedding blobs out of sqlite into a single
+contiguous float32 file that the API server memory-maps at startup.
+
+Writes embeddings.bin (L2-normalized float32 rows) next to the database and
+an embedding_offsets table mapping (tbl, chunk_id) -> row index. Safe to
+re-run; the offsets table and bin file are rebuilt from scratch.
+
+Usage: python migrate_embeddings.py [chunks.db]
+"""
+import os
+import sys
+import sqlite3
+import pickle
+import numpy as np
+
+DB_FILE = "chunks.db"
+EMBEDDINGS_BIN = "embeddings.bin"
+EMB_DIM = 384
+SKIP_TABLES = {"sqlite_sequence", "chat_sessions", "chat_messages",
+               "question_cache", "embedding_offsets"}
+
+
+def decode_embedding(emb_blob):
+    # Raw float32 blobs are exactly EMB_DIM * 4 bytes; anything else is a
+    # pickled ndarray (pickle framing rules out that exact length).
+    try:
+        if len(emb_blob) == EMB_DIM * 4:
+            return np.frombuffer(emb_blob, dtype=np.float32)
+        return np.asarray(pickle.loads(emb_blob), dtype=np.float32)
+    except:
+        return None
+
+
+def main():
+    db_path = sys.argv[1] if len(sys.argv) > 1 else DB_FILE
+    if not os.path.exists(db_path):
+        print(f"DB file '{db_path}' not found.")
+        sys.exit(1)
+
+    conn = sqlite3.connect(db_path)
+    cur = conn.cursor()
+    cur.execute("SELECT name FROM sqlite_master WHERE type='table';")
+    tables = [r[0] for r in cur.fetchall() if r[0] not in SKIP_TABLES]
+
+    cur.execute("DROP TABLE IF EXISTS embedding_offsets")
+    cur.execute("""
+        CREATE TABLE embedding_offsets (
+            tbl TEXT,
+            chunk_id INTEGER,
+            row INTEGER,
+            PRIMARY KEY (tbl, chunk_id)
+        )
+    """)
+
+    bin_path = os.path.join(os.path.dirname(os.path.abspath(db_path)), EMBEDDINGS_BIN)
+    row = 0
+    with open(bin_path, "wb") as out:
+        for t in tables:
+            try:
+                cur.execute(f'SELECT chunk_id, embedding FROM "{t}"')
+                rows = cur.fetchall()
+            except sqlite3.OperationalError:
+                continue
+            for cid, emb_blob in rows:
+                if emb_blob is None:
+                    continue
+                emb = decode_embedding(emb_blob)
+                if emb is None or emb.size != EMB_DIM:
+                    continue
+                norm = float(np.linalg.norm(emb))
+                if norm > 1e-12:
+                    emb = emb / norm
+                out.write(emb.astype(np.float32).tobytes())
+                cur.execute(
+                    "INSERT INTO embedding_offsets (tbl, chunk_id, row) VALUES (?, ?, ?)",
+                    (t, int(cid), row)
+                )
+                row += 1
+
+    conn.commit()
+    conn.close()
+    print(f"Wrote {row} embeddings to {bin_path}.")
+
+
+if __name__ == "__main__":
+    main()